@@ -0,0 +1,151 @@
+# app/llm/cache.py
+"""
+Response cache for OpenAI calls.
+
+Two kinds of entries are stored:
+- chat completions, keyed on (model, messages, tools, temperature)
+- embeddings, keyed on (model, sha256(text)); these never change for a given
+  model, so they are stored without expiry.
+
+Storage is pluggable through the `CacheBackend` protocol. `DiskCacheBackend`
+(diskcache, persistent and process-safe) is the default; `MemoryBackend` keeps
+entries in-process only.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+__all__ = ["CacheBackend", "MemoryBackend", "DiskCacheBackend", "LLMCache"]
+
+
+class CacheBackend(Protocol):
+    """Minimal key/value interface used by `LLMCache`."""
+
+    def get(self, key: str) -> Optional[Any]: ...
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None: ...
+
+
+class MemoryBackend:
+    """In-process dict backend with optional per-entry expiry."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+
+
+class DiskCacheBackend:
+    """Persistent backend on top of `diskcache.Cache`."""
+
+    def __init__(self, directory: str) -> None:
+        import diskcache
+
+        self._cache = diskcache.Cache(directory)
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self._cache.set(key, value, expire=ttl)
+
+
+class LLMCache:
+    """
+    Deterministic cache for chat completions and embeddings.
+
+    Chat results are only cached when the sampling temperature is at most
+    `max_temperature`; above that, responses are not expected to repeat.
+    `hits` / `misses` count lookups for metrics.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: Optional[int] = 86400,
+        max_temperature: float = 0.3,
+    ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_dir(cls, directory: str, **kwargs: Any) -> "LLMCache":
+        """Build a cache persisted under `directory`."""
+        return cls(DiskCacheBackend(directory), **kwargs)
+
+    @staticmethod
+    def chat_key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        temperature: float,
+    ) -> str:
+        payload = {"model": model, "messages": messages, "tools": tools, "temperature": temperature}
+        blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return "chat:" + hashlib.sha256(blob).hexdigest()
+
+    @staticmethod
+    def embedding_key(model: str, text: str) -> str:
+        return f"emb:{model}:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        self.backend.set(key, value, ttl=ttl)
+
+    def get_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        temperature: float,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Look up a chat result.
+
+        Returns:
+            (key, cached_result). `key` is None when the call is not cacheable;
+            otherwise pass it to `set_chat` after a miss.
+        """
+        if temperature > self.max_temperature:
+            return None, None
+        key = self.chat_key(model, messages, tools, temperature)
+        return key, self.get(key)
+
+    def set_chat(self, key: str, result: Dict[str, Any]) -> None:
+        self.set(key, result, ttl=self.ttl)
+
+    def get_embeddings(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return one cached embedding (or None) per text."""
+        return [self.get(self.embedding_key(model, t)) for t in texts]
+
+    def set_embeddings(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        for t, emb in zip(texts, embeddings):
+            self.set(self.embedding_key(model, t), emb)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -1,134 +1,407 @@
 """
 Orchestrator: retrieve -> LLM choose title -> tool call -> final answer.
+
+`arun_chain` is the async implementation; `run_chain` is a blocking wrapper.
+`arun_chain_stream` / `run_chain_stream` yield the same result as events
+(retrieval, tool result, answer tokens) while the chain runs.
 """
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List, Optional
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+import orjson
 
-from app.llm.openai_client import OpenAIClient
+from app.llm.openai_client import OpenAIClient, get_client, run_async
 from app.llm.prompts import SYSTEM_PROMPT, USER_TEMPLATE
-from app.llm.tools import build_tools_spec, handle_tool_call
-from app.rag.retriever import retrieve
+from app.llm.tools import (
+    _TitleIndex,
+    _load_title_index,
+    _read_title_index,
+    _normalize,
+    build_tools_spec,
+    handle_tool_call,
+)
+from app.rag.retriever import aretrieve
+from app.rag.vectorstore import open_collection
 
+# Retrieval is trusted to pick the title (skipping the selection turn) when the
+# top hit is at least this close and its title is in the tool's dataset.
+FAST_PATH_MAX_DISTANCE = 0.25
 
-def _extract_short_summary(doc_text: str) -> str:
-    # doc_text has lines like "Title: ...\nSummary: ...\nThemes: ..."
-    if not doc_text:
-        return ""
-    parts = doc_text.split("Summary:", 1)
-    if len(parts) < 2:
-        return doc_text.strip()
-    summary = parts[1].strip()
-    # Cut at Themes: or limit length
-    summary = summary.split("Themes:", 1)[0].strip()
-    if len(summary) > 800:
-        summary = summary[:800].rstrip() + "…"
-    return summary
+T = TypeVar("T")
 
 
-def _format_context(results: List[Dict[str, Any]]) -> str:
-    lines: List[str] = []
-    for r in results:
-        title = r.get("title") or "(unknown)"
-        themes = r.get("themes") or "N/A"
-        short = _extract_short_summary(r.get("document") or "")
-        lines.append(f"- Title: {title}\n  Themes: {themes}\n  Short Summary: {short}")
-    return "\n".join(lines)
+@dataclass(frozen=True)
+class ChainContext:
+    """
+    Open handles for one (persist_dir, collection_name, model) configuration,
+    built once by `build_chain_context` and passed to the chain entrypoints
+    so each query only pays for the query itself.
+    """
+    client: OpenAIClient
+    collection: Any
+    index: _TitleIndex
+    persist_dir: str = "data/chroma"
+    collection_name: str = "books_v1"
+    model: Optional[str] = None
 
 
-def run_chain(
-    query: str,
-    top_k: int = 5,
+def build_chain_context(
     persist_dir: str = "data/chroma",
     collection_name: str = "books_v1",
     model: Optional[str] = None,
-) -> Dict[str, Any]:
+) -> ChainContext:
     """
-    Main entrypoint for the RAG chain.
+    Open the OpenAI client, the vector collection and the title index.
 
-    Returns a dict:
-        {
-            "content": str,             # final assistant message
-            "chosen_title": str | None, # title passed to the tool (if any)
-            "full_summary": str | None, # tool result summary
-            "tool_match_score": float | None,
-            "retrieval": [ {title, themes, distance}, ... ]
-        }
+    The collection and the title index are read from disk (not taken from
+    the process-wide caches), so building a new context picks up a re-run
+    ingest. Tool calls made with the context match against its own index.
     """
-    # 1) Retrieve context
-    retrieved = retrieve(
-        query=query,
-        top_k=top_k,
+    return ChainContext(
+        client=get_client(),
+        collection=open_collection(persist_dir=persist_dir, collection_name=collection_name),
+        index=_read_title_index(),
         persist_dir=persist_dir,
         collection_name=collection_name,
+        model=model,
+    )
+
+
+def _format_context(results: List[Dict[str, Any]]) -> str:
+    return "\n".join(
+        f"- Title: {r.get('title') or '(unknown)'}\n"
+        f"  Themes: {r.get('themes') or 'N/A'}\n"
+        f"  Short Summary: {r.get('short_summary') or ''}"
+        for r in results
+    )
+
+
+def _direct_tool_message(retrieved: List[Dict[str, Any]], index: _TitleIndex) -> Optional[Dict[str, Any]]:
+    """
+    Assistant message calling get_summary_by_title for the top hit when
+    retrieval is confident enough to skip the title-selection turn; else None.
+    """
+    if not retrieved:
+        return None
+    top = retrieved[0]
+    distance = top.get("distance")
+    title = top.get("title")
+    if distance is None or distance >= FAST_PATH_MAX_DISTANCE or not title:
+        return None
+    # Exact or normalized-exact hits only: a partial match ("Dune Messiah"
+    # -> "Dune") means the book is missing from the dataset, so let the model
+    # choose. Indexes built by ingest carry the normalized title.
+    norm_title = top.get("norm_title") or _normalize(title)
+    if title.lower() not in index.by_lower and norm_title not in index.by_norm:
+        return None
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{
+            "id": "call_direct_0",
+            "type": "function",
+            "function": {
+                "name": "get_summary_by_title",
+                "arguments": orjson.dumps({"title": title}).decode("utf-8"),
+            },
+        }],
+    }
+
+
+class _Selection(NamedTuple):
+    """Outcome of the title-selection turn and tool calls."""
+    messages: List[Dict[str, Any]]  # conversation so far, incl. tool results
+    tools: List[Dict[str, Any]]
+    called_tool: bool               # False: `content` is already the answer
+    content: str
+    chosen_title: Optional[str]
+    full_summary: Optional[str]
+    tool_match_score: Optional[float]
+
+
+async def _aretrieve_context(
+    query: str,
+    top_k: int,
+    persist_dir: str,
+    collection_name: str,
+    ctx: Optional[ChainContext] = None,
+) -> Tuple[List[Dict[str, Any]], _TitleIndex]:
+    if ctx is not None:
+        retrieved = await aretrieve(
+            query=query,
+            top_k=top_k,
+            client=ctx.client,
+            collection=ctx.collection,
+        )
+        return retrieved, ctx.index
+    # Load the tool's dataset during retrieval so the tool call does not pay
+    # for it later.
+    retrieved, index = await asyncio.gather(
+        aretrieve(
+            query=query,
+            top_k=top_k,
+            persist_dir=persist_dir,
+            collection_name=collection_name,
+        ),
+        asyncio.to_thread(_load_title_index),
     )
+    return retrieved, index
+
+
+async def _aselect(
+    query: str,
+    retrieved: List[Dict[str, Any]],
+    index: _TitleIndex,
+    model: Optional[str],
+    client: OpenAIClient,
+) -> _Selection:
     context = _format_context(retrieved)
 
-    # 2) Build messages
+    # Build messages
     messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": USER_TEMPLATE.format(query=query, context=context)},
     ]
 
-    client = OpenAIClient()
     tools = build_tools_spec()
 
-    # 3) Ask model (expect a tool call)
-    first = client.chat(messages=messages, tools=tools, model=model)
-    assistant_msg = first["message"]
+    # Ask model (expect a tool call), unless retrieval already settled the title
+    assistant_msg = _direct_tool_message(retrieved, index)
+    if assistant_msg is None:
+        first = await client.achat(messages=messages, tools=tools, model=model)
+        assistant_msg = first["message"]
     tool_calls = assistant_msg.get("tool_calls") or []
 
+    if not tool_calls:
+        # No tool call; graceful fallback
+        return _Selection(
+            messages=messages,
+            tools=tools,
+            called_tool=False,
+            content=(assistant_msg.get("content") or "").strip(),
+            chosen_title=retrieved[0].get("title") if retrieved else None,
+            full_summary=None,
+            tool_match_score=None,
+        )
+
     chosen_title = None
     full_summary = None
     tool_match_score = None
 
-    if tool_calls:
-        # Execute tool(s), then send tool results back for final answer
-        messages.append(assistant_msg)  # keep the original assistant message
-        for tc in tool_calls:
-            if tc.get("type") != "function":
-                continue
-            fn = tc.get("function", {}) or {}
-            name = fn.get("name")
-            args = fn.get("arguments") or "{}"
-            if name == "get_summary_by_title":
-                tool_res = handle_tool_call(name, args)
-                chosen_title = tool_res.get("title")
-                full_summary = tool_res.get("summary")
-                tool_match_score = tool_res.get("match_score")
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc.get("id"),
-                    "name": name,
-                    "content": json.dumps(tool_res),
-                })
-        # 4) Finalization turn
-        second = client.chat(messages=messages, tools=tools, model=model)
-        final_content = (second["message"].get("content") or "").strip()
-    else:
-        # No tool call; graceful fallback
-        final_content = (assistant_msg.get("content") or "").strip()
-        if retrieved:
-            chosen_title = retrieved[0].get("title")
+    # Execute tool(s); their results go back to the model for the final answer
+    messages.append(assistant_msg)  # keep the original assistant message
+    tool_names = {t["function"]["name"] for t in tools}
+    calls = [
+        tc for tc in tool_calls
+        if tc.get("type") == "function" and (tc.get("function") or {}).get("name") in tool_names
+    ]
+    # Independent calls run concurrently in worker threads; results are
+    # appended in the order the model emitted them.
+    results = await asyncio.gather(*(
+        asyncio.to_thread(
+            handle_tool_call, tc["function"]["name"], tc["function"].get("arguments") or "{}", index=index
+        )
+        for tc in calls
+    ))
+    for tc, tool_res in zip(calls, results):
+        name = tc["function"]["name"]
+        if name == "get_summary_by_title":
+            chosen_title = tool_res.get("title")
+            full_summary = tool_res.get("summary")
+            tool_match_score = tool_res.get("match_score")
+        messages.append({
+            "role": "tool",
+            "tool_call_id": tc.get("id"),
+            "name": name,
+            "content": orjson.dumps(tool_res).decode("utf-8"),
+        })
+    return _Selection(
+        messages=messages,
+        tools=tools,
+        called_tool=True,
+        content="",
+        chosen_title=chosen_title,
+        full_summary=full_summary,
+        tool_match_score=tool_match_score,
+    )
+
 
-    retrieval_view = [
+def _retrieval_view(retrieved: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
         {"title": r.get("title"), "themes": r.get("themes"), "distance": r.get("distance")}
         for r in retrieved
     ]
 
+
+def _result(sel: _Selection, content: Any, retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
     return {
-        "content": final_content,
-        "chosen_title": chosen_title,
-        "full_summary": full_summary,
-        "tool_match_score": tool_match_score,
-        "retrieval": retrieval_view,
+        "content": content,
+        "chosen_title": sel.chosen_title,
+        "full_summary": sel.full_summary,
+        "tool_match_score": sel.tool_match_score,
+        "retrieval": _retrieval_view(retrieved),
+    }
+
+
+async def arun_chain(
+    query: str,
+    top_k: int = 5,
+    persist_dir: str = "data/chroma",
+    collection_name: str = "books_v1",
+    model: Optional[str] = None,
+    stream: bool = False,
+    ctx: Optional[ChainContext] = None,
+) -> Dict[str, Any]:
+    """
+    Main entrypoint for the RAG chain.
+
+    `ctx` (see `build_chain_context`) supplies already-open handles; its
+    persist_dir/collection_name then apply, and its model unless `model` is set.
+
+    When the top retrieval hit is close enough (see FAST_PATH_MAX_DISTANCE) and
+    its title is in the tool's dataset, the tool is called for it directly and
+    only the finalization turn goes to the model.
+
+    With `stream=True` the tool-selection turn still runs to completion (its
+    tool_calls must be parsed), but "content" is an iterator of text deltas
+    from the finalization turn, which starts on first iteration.
+
+    Returns a dict:
+        {
+            "content": str | Iterator[str], # final assistant message
+            "chosen_title": str | None, # title passed to the tool (if any)
+            "full_summary": str | None, # tool result summary
+            "tool_match_score": float | None,
+            "retrieval": [ {title, themes, distance}, ... ]
+        }
+    """
+    client = ctx.client if ctx else get_client()
+    model = model or (ctx.model if ctx else None)
+
+    # 1) Retrieve context
+    retrieved, index = await _aretrieve_context(query, top_k, persist_dir, collection_name, ctx)
+
+    # 2) Title selection + tool calls
+    sel = await _aselect(query, retrieved, index, model, client)
+
+    # 3) Finalization turn
+    if not sel.called_tool:
+        final_content: Any = iter([sel.content]) if stream else sel.content
+    elif stream:
+        final_content = client.stream_chat(messages=sel.messages, tools=sel.tools, model=model)
+    else:
+        second = await client.achat(messages=sel.messages, tools=sel.tools, model=model)
+        final_content = (second["message"].get("content") or "").strip()
+
+    return _result(sel, final_content, retrieved)
+
+
+def run_chain(
+    query: str,
+    top_k: int = 5,
+    persist_dir: str = "data/chroma",
+    collection_name: str = "books_v1",
+    model: Optional[str] = None,
+    stream: bool = False,
+    ctx: Optional[ChainContext] = None,
+) -> Dict[str, Any]:
+    """Blocking wrapper around `arun_chain` (same arguments and return value)."""
+    return run_async(arun_chain(
+        query=query,
+        top_k=top_k,
+        persist_dir=persist_dir,
+        collection_name=collection_name,
+        model=model,
+        stream=stream,
+        ctx=ctx,
+    ))
+
+
+async def arun_chain_stream(
+    query: str,
+    top_k: int = 5,
+    persist_dir: str = "data/chroma",
+    collection_name: str = "books_v1",
+    model: Optional[str] = None,
+    ctx: Optional[ChainContext] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run the chain, yielding (event, payload) tuples as results become available:
+
+        ("retrieval", [ {title, themes, distance}, ... ])   after retrieval
+        ("meta", {chosen_title, full_summary, tool_match_score})   after the tool call
+        ("token", str)   text deltas of the final answer
+        ("done", dict)   same dict as `run_chain`, "content" being the full text
+
+    `ctx` is used as in `arun_chain`.
+    """
+    client = ctx.client if ctx else get_client()
+    model = model or (ctx.model if ctx else None)
+
+    retrieved, index = await _aretrieve_context(query, top_k, persist_dir, collection_name, ctx)
+    yield "retrieval", _retrieval_view(retrieved)
+
+    sel = await _aselect(query, retrieved, index, model, client)
+    yield "meta", {
+        "chosen_title": sel.chosen_title,
+        "full_summary": sel.full_summary,
+        "tool_match_score": sel.tool_match_score,
     }
 
+    parts: List[str] = []
+    if sel.called_tool:
+        async for delta in client.astream_chat(messages=sel.messages, tools=sel.tools, model=model):
+            parts.append(delta)
+            yield "token", delta
+    elif sel.content:
+        parts.append(sel.content)
+        yield "token", sel.content
+
+    yield "done", _result(sel, "".join(parts).strip(), retrieved)
+
+
+async def _anext(agen: AsyncIterator[T]) -> T:
+    return await agen.__anext__()
+
+
+def run_chain_stream(
+    query: str,
+    top_k: int = 5,
+    persist_dir: str = "data/chroma",
+    collection_name: str = "books_v1",
+    model: Optional[str] = None,
+    ctx: Optional[ChainContext] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """Blocking iterator over `arun_chain_stream` (same arguments and events)."""
+    # Every step runs on the shared event loop, so queries reuse the async
+    # client's connection pool.
+    agen = arun_chain_stream(
+        query=query,
+        top_k=top_k,
+        persist_dir=persist_dir,
+        collection_name=collection_name,
+        model=model,
+        ctx=ctx,
+    )
+    try:
+        while True:
+            try:
+                yield run_async(_anext(agen))
+            except StopAsyncIteration:
+                break
+    finally:
+        run_async(agen.aclose())
+
 
 if __name__ == "__main__":
-    out = run_chain("I want a story about friendship and magic at a boarding school", top_k=5)
-    print("Chosen title:", out["chosen_title"])
-    print("Tool score:", out["tool_match_score"])
-    print("---- Final content ----")
-    print(out["content"][:800])
+    for event, payload in run_chain_stream("I want a story about friendship and magic at a boarding school", top_k=5):
+        if event == "meta":
+            print("Chosen title:", payload["chosen_title"])
+            print("Tool score:", payload["tool_match_score"])
+            print("---- Final content ----")
+        elif event == "token":
+            print(payload, end="", flush=True)
+    print()
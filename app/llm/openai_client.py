@@ -10,20 +10,113 @@ Environment variables:
     OPENAI_API_KEY      - required
     OPENAI_BASE_URL     - optional (for Azure/OpenAI-compatible proxies)
     OPENAI_EMBEDDING_MODEL - optional, default: text-embedding-3-small
+    OPENAI_EMBEDDING_DIMENSIONS - optional, shorten embeddings to this size (text-embedding-3 models)
     OPENAI_CHAT_MODEL      - optional, default: gpt-4o-mini
     OPENAI_TEMPERATURE     - optional, default: 0.2
+    LLM_CACHE_DIR          - optional, default: data/llm_cache (empty disables the cache)
+    LLM_CACHE_TTL          - optional, seconds a cached chat response is kept, default: 86400
 """
 from __future__ import annotations
 
+import asyncio
 import os
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import threading
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterator, List, Optional, Tuple, TypeVar
 
+import httpx
+import tiktoken
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from tenacity import retry, stop_after_attempt, wait_exponential
 
-__all__ = ["OpenAISettings", "OpenAIClient"]
+from app.llm.cache import LLMCache
+
+__all__ = ["OpenAISettings", "OpenAIClient", "get_client", "run_async", "shared_event_loop"]
+
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=60.0)
+_HTTP_TIMEOUT = 30.0
+
+# Embedding request limits: inputs per request and total tokens per request
+# (the API allows ~300K tokens; keep headroom).
+MAX_INPUTS_PER_REQ = 2048
+MAX_TOKENS_PER_REQ = 250_000
+
+# One keep-alive pool for every sync client in the process; HTTP/2 lets
+# concurrent requests share a single connection to the API.
+_SHARED_HTTP = httpx.Client(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+# Async connection pools are bound to their event loop. Sync callers run
+# coroutines on this one long-lived loop (see `run_async`) so the AsyncOpenAI
+# client created for it, and its connections, are reused across queries.
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+T = TypeVar("T")
+
+
+def shared_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop, started on a daemon thread on first use."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Run `coro` on the shared event loop and block until it finishes."""
+    loop = shared_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_async() called from the shared event loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+@lru_cache(maxsize=8)
+def _token_encoder(model: str) -> Optional["tiktoken.Encoding"]:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # BPE files could not be loaded (e.g. offline); callers fall back.
+        return None
+
+
+def _count_tokens(model: str, texts: List[str]) -> List[int]:
+    """Token count per text; UTF-8 byte length (an upper bound) if no encoder."""
+    enc = _token_encoder(model)
+    if enc is None:
+        return [len(t.encode("utf-8")) for t in texts]
+    return [len(toks) for toks in enc.encode_ordinary_batch(texts)]
+
+
+def _pack_batches(token_counts: List[int], max_inputs: int, max_tokens: int) -> List[List[int]]:
+    """
+    Group positions 0..n-1 into consecutive batches that stay within
+    `max_inputs` items and `max_tokens` total tokens. An item larger than
+    `max_tokens` gets a batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, n in enumerate(token_counts):
+        if current and (len(current) >= max_inputs or current_tokens + n > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
 
 
 @dataclass
@@ -32,8 +125,11 @@ class OpenAISettings:
     api_key: str
     base_url: Optional[str] = None
     embedding_model: str = "text-embedding-3-small"
+    embedding_dimensions: Optional[int] = None
     chat_model: str = "gpt-4o-mini"
     temperature: float = 0.2
+    cache_dir: Optional[str] = None
+    cache_ttl: int = 86400
 
     @classmethod
     def from_env(cls) -> "OpenAISettings":
@@ -54,18 +150,33 @@ class OpenAISettings:
         embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
         chat_model = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 
+        dims_str = os.getenv("OPENAI_EMBEDDING_DIMENSIONS", "")
+        try:
+            embedding_dimensions = int(dims_str) if dims_str else None
+        except ValueError:
+            embedding_dimensions = None
+
         temp_str = os.getenv("OPENAI_TEMPERATURE", "0.2")
         try:
             temperature = float(temp_str)
         except ValueError:
             temperature = 0.2
 
+        cache_dir = os.getenv("LLM_CACHE_DIR", "data/llm_cache") or None
+        try:
+            cache_ttl = int(os.getenv("LLM_CACHE_TTL", "86400"))
+        except ValueError:
+            cache_ttl = 86400
+
         return cls(
             api_key=api_key,
             base_url=base_url,
             embedding_model=embedding_model,
+            embedding_dimensions=embedding_dimensions,
             chat_model=chat_model,
             temperature=temperature,
+            cache_dir=cache_dir,
+            cache_ttl=cache_ttl,
         )
 
 
@@ -74,21 +185,114 @@ class OpenAIClient:
     Thin wrapper around the official OpenAI Python client (v1+).
 
     - `embed_texts(texts)`: returns list of embeddings (one per input).
+    - `aembed_texts(texts)`: async variant; sends sub-batches concurrently.
     - `chat(messages, tools=None, ...)`: returns dict with assistant message (and tool_calls if any).
+    - `achat(messages, tools=None, ...)`: async variant of `chat`.
+    - `stream_chat(messages, tools=None, ...)`: yields content deltas as they arrive.
+
+    Chat responses and embeddings go through an `LLMCache` when one is
+    configured (see `OpenAISettings.cache_dir`).
     """
 
-    def __init__(self, settings: Optional[OpenAISettings] = None) -> None:
+    def __init__(
+        self,
+        settings: Optional[OpenAISettings] = None,
+        cache: Optional[LLMCache] = None,
+    ) -> None:
         self.settings = settings or OpenAISettings.from_env()
+        if cache is None and self.settings.cache_dir:
+            cache = LLMCache.from_dir(self.settings.cache_dir, ttl=self.settings.cache_ttl)
+        self.cache = cache
         if self.settings.base_url:
-            self.client = OpenAI(api_key=self.settings.api_key, base_url=self.settings.base_url)
+            self.client = OpenAI(
+                api_key=self.settings.api_key,
+                base_url=self.settings.base_url,
+                http_client=_SHARED_HTTP,
+            )
         else:
-            self.client = OpenAI(api_key=self.settings.api_key)
+            self.client = OpenAI(api_key=self.settings.api_key, http_client=_SHARED_HTTP)
+        # httpx connection pools are bound to the event loop that opened them,
+        # so keep one AsyncOpenAI per running loop (normally just the shared
+        # loop; other loops come from one-off asyncio.run calls such as ingest).
+        self._async_clients: Dict[asyncio.AbstractEventLoop, AsyncOpenAI] = {}
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """Return the AsyncOpenAI client for the currently running event loop."""
+        loop = asyncio.get_running_loop()
+        aclient = self._async_clients.get(loop)
+        if aclient is None:
+            # Forget clients of finished loops (e.g. earlier asyncio.run calls).
+            for old in [lp for lp in self._async_clients if lp.is_closed()]:
+                del self._async_clients[old]
+            http_client = httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+            if self.settings.base_url:
+                aclient = AsyncOpenAI(
+                    api_key=self.settings.api_key,
+                    base_url=self.settings.base_url,
+                    http_client=http_client,
+                )
+            else:
+                aclient = AsyncOpenAI(api_key=self.settings.api_key, http_client=http_client)
+            self._async_clients[loop] = aclient
+        return aclient
+
+    def _embedding_kwargs(self, model: str) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"model": model}
+        if self.settings.embedding_dimensions:
+            kwargs["dimensions"] = self.settings.embedding_dimensions
+        return kwargs
+
+    def _embedding_cache_ns(self, model: str) -> str:
+        dims = self.settings.embedding_dimensions
+        return f"{model}@{dims}" if dims else model
+
+    def _cached_embeddings(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        if self.cache is None:
+            return [None] * len(texts)
+        return self.cache.get_embeddings(self._embedding_cache_ns(model), texts)
+
+    def _store_embeddings(
+        self,
+        model: str,
+        texts: List[str],
+        out: List[Optional[List[float]]],
+        indices: List[int],
+        embeddings: List[List[float]],
+    ) -> None:
+        for i, emb in zip(indices, embeddings):
+            out[i] = emb
+        if self.cache is not None:
+            self.cache.set_embeddings(self._embedding_cache_ns(model), [texts[i] for i in indices], embeddings)
+
+    def _embedding_batches(self, model: str, texts: List[str], indices: List[int]) -> List[List[int]]:
+        """Split `indices` (positions in `texts`) into token-budgeted request batches."""
+        # A token is at least one UTF-8 byte, so inputs whose total byte length
+        # fits the budget fit in one request: skip tokenizing (the first
+        # tiktoken use loads its BPE file, which can mean a download).
+        if len(indices) == 1 or (
+            len(indices) <= MAX_INPUTS_PER_REQ
+            and sum(len(texts[i].encode("utf-8")) for i in indices) <= MAX_TOKENS_PER_REQ
+        ):
+            return [list(indices)]
+        counts = _count_tokens(model, [texts[i] for i in indices])
+        return [
+            [indices[j] for j in batch]
+            for batch in _pack_batches(counts, MAX_INPUTS_PER_REQ, MAX_TOKENS_PER_REQ)
+        ]
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=4), reraise=True)
+    def _embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        resp = self.client.embeddings.create(input=texts, **self._embedding_kwargs(model))
+        return [d.embedding for d in resp.data]
+
     def embed_texts(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
         """
         Create embeddings for a batch of texts.
 
+        Inputs are packed into requests that respect the per-request input
+        and token limits; requests are sent one after another (see
+        `aembed_texts` for the concurrent variant).
+
         Args:
             texts: List of strings to embed.
             model: Optional override for embedding model.
@@ -102,9 +306,65 @@ class OpenAIClient:
         if not isinstance(texts, list) or not texts:
             raise ValueError("texts must be a non-empty list of strings")
         model_name = model or self.settings.embedding_model
-        resp = self.client.embeddings.create(model=model_name, input=texts)
+        out = self._cached_embeddings(model_name, texts)
+        missing = [i for i, emb in enumerate(out) if emb is None]
+        if missing:
+            for batch in self._embedding_batches(model_name, texts, missing):
+                embs = self._embed_batch([texts[i] for i in batch], model_name)
+                self._store_embeddings(model_name, texts, out, batch, embs)
+        return out
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=4), reraise=True)
+    async def _aembed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        resp = await self._get_async_client().embeddings.create(
+            input=texts, **self._embedding_kwargs(model)
+        )
         return [d.embedding for d in resp.data]
 
+    async def aembed_texts(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        max_concurrency: int = 5,
+    ) -> List[List[float]]:
+        """
+        Create embeddings for many texts using concurrent sub-batch requests.
+
+        Sub-batches are packed with tiktoken counts up to MAX_TOKENS_PER_REQ
+        tokens / MAX_INPUTS_PER_REQ inputs. Each one is retried on its own,
+        so a transient error (e.g. 429) does not fail the whole run.
+
+        Args:
+            texts: List of strings to embed.
+            model: Optional override for embedding model.
+            max_concurrency: Maximum number of requests in flight.
+
+        Returns:
+            List[List[float]]: One embedding per input text, in input order.
+
+        Raises:
+            ValueError: if `texts` is empty or not a list.
+        """
+        if not isinstance(texts, list) or not texts:
+            raise ValueError("texts must be a non-empty list of strings")
+        model_name = model or self.settings.embedding_model
+        # Cache reads/writes are blocking (SQLite): keep them off the event loop.
+        out = await asyncio.to_thread(self._cached_embeddings, model_name, texts)
+        missing = [i for i, emb in enumerate(out) if emb is None]
+        if not missing:
+            return out
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def _run(indices: List[int]) -> None:
+            async with sem:
+                embs = await self._aembed_batch([texts[i] for i in indices], model_name)
+            await asyncio.to_thread(self._store_embeddings, model_name, texts, out, indices, embs)
+
+        await asyncio.gather(*(
+            _run(batch) for batch in self._embedding_batches(model_name, texts, missing)
+        ))
+        return out
+
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=4), reraise=True)
     def chat(
         self,
@@ -133,6 +393,10 @@ class OpenAIClient:
         chat_model = model or self.settings.chat_model
         temp = self.settings.temperature if temperature is None else temperature
 
+        key, cached = self._cached_chat(chat_model, messages, tools, temp)
+        if cached is not None:
+            return cached
+
         resp = self.client.chat.completions.create(
             model=chat_model,
             messages=messages,
@@ -140,6 +404,110 @@ class OpenAIClient:
             tool_choice="auto" if tools else "none",
             temperature=temp,
         )
+        return self._store_chat(key, self._chat_result(resp))
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=4), reraise=True)
+    async def achat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Async variant of `chat`; same arguments and return shape."""
+        chat_model = model or self.settings.chat_model
+        temp = self.settings.temperature if temperature is None else temperature
+
+        # Cache reads/writes are blocking (SQLite): keep them off the event loop.
+        key, cached = await asyncio.to_thread(self._cached_chat, chat_model, messages, tools, temp)
+        if cached is not None:
+            return cached
+
+        resp = await self._get_async_client().chat.completions.create(
+            model=chat_model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto" if tools else "none",
+            temperature=temp,
+        )
+        return await asyncio.to_thread(self._store_chat, key, self._chat_result(resp))
+
+    def _cached_chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        temperature: float,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if self.cache is None:
+            return None, None
+        return self.cache.get_chat(model, messages, tools, temperature)
+
+    def _store_chat(self, key: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+        if key is not None and self.cache is not None:
+            self.cache.set_chat(key, result)
+        return result
+
+    def stream_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> Iterator[str]:
+        """
+        Run a streaming chat completion and yield assistant content deltas.
+
+        The request is sent on first iteration. Tool-call deltas are not
+        surfaced, so use `chat` when the reply may contain tool calls that
+        need handling. Streamed responses bypass the cache.
+        """
+        chat_model = model or self.settings.chat_model
+        temp = self.settings.temperature if temperature is None else temperature
+
+        resp = self.client.chat.completions.create(
+            model=chat_model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto" if tools else "none",
+            temperature=temp,
+            stream=True,
+        )
+        for chunk in resp:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def astream_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Async variant of `stream_chat`; same arguments, yields content deltas."""
+        chat_model = model or self.settings.chat_model
+        temp = self.settings.temperature if temperature is None else temperature
+
+        resp = await self._get_async_client().chat.completions.create(
+            model=chat_model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto" if tools else "none",
+            temperature=temp,
+            stream=True,
+        )
+        async for chunk in resp:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    @staticmethod
+    def _chat_result(resp: Any) -> Dict[str, Any]:
         choice = resp.choices[0]
         result = {
             "message": choice.message.model_dump(),
@@ -167,12 +535,28 @@ class OpenAIClient:
         return out
 
 
+@lru_cache(maxsize=4)
+def get_client(base_url: Optional[str] = None) -> OpenAIClient:
+    """
+    Return a process-wide OpenAIClient, so HTTP connections are reused
+    across requests.
+
+    Args:
+        base_url: Optional override for OPENAI_BASE_URL.
+    """
+    settings = OpenAISettings.from_env()
+    if base_url:
+        settings = replace(settings, base_url=base_url)
+    return OpenAIClient(settings)
+
+
 if __name__ == "__main__":
     # Non-network sanity check: just load settings.
     try:
         s = OpenAISettings.from_env()
         print("Loaded OpenAI settings OK.")
         print("Embedding model:", s.embedding_model)
+        print("Embedding dimensions:", s.embedding_dimensions or "model default")
         print("Chat model:", s.chat_model)
     except Exception as e:
         print("Settings error:", e)
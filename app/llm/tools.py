@@ -7,6 +7,7 @@ Provides:
   - get_summary_by_title(title: str): return the full summary for a book title.
   - build_tools_spec(): OpenAI "function" schema for tool-calling.
   - handle_tool_call(name, arguments_json): router to execute a tool call.
+  - build_title_index(json_path): precompute the title index sidecar (run by ingest).
 
 Design goals:
   - Be robust: accept case-insensitive and lightly-fuzzy matches.
@@ -14,50 +15,152 @@ Design goals:
 """
 from __future__ import annotations
 
-import json
-import re
+import pickle
 import unicodedata
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Tuple
-from difflib import SequenceMatcher
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import orjson
+from rapidfuzz import fuzz, process
 
 
 DEFAULT_DATA_PATH = Path("data/book_summaries_full.json")
 
 
+def _ascii_fold(text: str) -> str:
+    """NFKD-decompose and drop anything that is not ASCII (é -> e)."""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def _build_normalize_table() -> Dict[int, str]:
+    # ASCII: A-Z -> a-z, keep [a-z0-9], everything else -> space
+    table: Dict[int, str] = {}
+    for c in range(128):
+        ch = chr(c)
+        if "A" <= ch <= "Z":
+            table[c] = ch.lower()
+        elif ch.isalnum():
+            table[c] = ch
+        else:
+            table[c] = " "
+    # Latin-1 Supplement + Latin Extended-A: accent-fold, then map as above
+    # (é -> e, Ñ -> n); covers the accented characters found in book titles.
+    for c in range(0x80, 0x180):
+        table[c] = "".join(table[ord(a)] for a in _ascii_fold(chr(c)))
+    return table
+
+
+_NORMALIZE_TABLE = _build_normalize_table()
+
+
 def _normalize(text: str) -> str:
     """Lowercase, strip accents/punctuation, collapse whitespace."""
     if text is None:
         return ""
-    # lower + NFKD strip accents
-    t = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
-    t = t.lower()
-    # keep alnum + space
-    t = re.sub(r"[^a-z0-9\s]+", " ", t)
+    # one translate pass does lowercasing, accent folding and punctuation
+    t = text.translate(_NORMALIZE_TABLE)
+    if not t.isascii():
+        # characters outside the table: full NFKD path
+        t = _ascii_fold(t).translate(_NORMALIZE_TABLE)
     # collapse whitespace
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
+    return " ".join(t.split())
 
 
-@lru_cache(maxsize=1)
-def _load_full_summaries(path: str = str(DEFAULT_DATA_PATH)) -> Dict[str, str]:
-    p = Path(path)
+_INDEX_VERSION = 2
+
+
+class _TitleIndex(NamedTuple):
+    """
+    Dataset as parallel arrays (titles[i] <-> summaries[i] <-> norm_titles[i])
+    plus lookup tables from lowercased / normalized title to position.
+    """
+    titles: Tuple[str, ...]
+    summaries: Tuple[str, ...]
+    norm_titles: Tuple[str, ...]
+    by_lower: Dict[str, int]
+    by_norm: Dict[str, int]
+
+
+def _index_sidecar_path(json_path: str) -> Path:
+    p = Path(json_path)
+    return p.with_name(p.stem + ".index.pickle")
+
+
+def _read_full_summaries(p: Path) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
     if not p.exists():
         raise FileNotFoundError(f"Full summaries JSON not found: {p}")
-    with p.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = orjson.loads(p.read_bytes())
     if not isinstance(data, dict) or not data:
         raise ValueError("Full summaries JSON must be a non-empty object {title: summary}.")
-    return data
+    return tuple(data.keys()), tuple(data.values())
+
 
+def _make_index(
+    titles: Tuple[str, ...],
+    summaries: Tuple[str, ...],
+    norm_titles: Tuple[str, ...],
+) -> _TitleIndex:
+    by_lower: Dict[str, int] = {}
+    for i, t in enumerate(titles):
+        by_lower.setdefault(t.lower(), i)
+    by_norm = {n: i for i, n in enumerate(norm_titles)}
+    return _TitleIndex(titles, summaries, norm_titles, by_lower, by_norm)
 
-def _best_title_match(query_title: str, data: Dict[str, str]) -> Tuple[Optional[str], float]:
+
+def build_title_index(json_path: str = str(DEFAULT_DATA_PATH)) -> Path:
+    """
+    Precompute the title index for `json_path` and write it next to it as
+    `<stem>.index.pickle`. Loaders use it only while the JSON's size and
+    mtime still match the ones recorded here.
+
+    Returns:
+        Path of the written sidecar.
+    """
+    p = Path(json_path)
+    # stat before reading, so a write racing the build makes the index stale
+    st = p.stat()
+    titles, summaries = _read_full_summaries(p)
+    payload = {
+        "version": _INDEX_VERSION,
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "titles": titles,
+        "summaries": summaries,
+        "norm_titles": tuple(_normalize(t) for t in titles),
+    }
+    out = _index_sidecar_path(json_path)
+    out.write_bytes(pickle.dumps(payload, protocol=5))
+    return out
+
+
+def _read_title_index(path: str = str(DEFAULT_DATA_PATH)) -> _TitleIndex:
+    p = Path(path)
+    sidecar = _index_sidecar_path(path)
+    if p.exists() and sidecar.exists():
+        st = p.stat()
+        payload = pickle.loads(sidecar.read_bytes())
+        if (
+            payload.get("version") == _INDEX_VERSION
+            and payload.get("source_size") == st.st_size
+            and payload.get("source_mtime_ns") == st.st_mtime_ns
+        ):
+            return _make_index(payload["titles"], payload["summaries"], payload["norm_titles"])
+    titles, summaries = _read_full_summaries(p)
+    return _make_index(titles, summaries, tuple(_normalize(t) for t in titles))
+
+
+@lru_cache(maxsize=1)
+def _load_title_index(path: str = str(DEFAULT_DATA_PATH)) -> _TitleIndex:
+    return _read_title_index(path)
+
+
+def _best_title_match(query_title: str, index: _TitleIndex) -> Tuple[Optional[int], float]:
     """
-    Return (best_title, score in [0,1]). Strategy:
+    Return (position of the best title in `index`, score in [0,1]). Strategy:
       1) exact case-insensitive
       2) normalized exact (remove punctuation/accents)
-      3) fuzzy ratio (difflib), take best >= 0.72
+      3) fuzzy ratio (rapidfuzz), take best >= 0.72
       4) containment heuristic on normalized strings (>= 0.66)
     """
     if not query_title:
@@ -67,38 +170,48 @@ def _best_title_match(query_title: str, data: Dict[str, str]) -> Tuple[Optional[
     q_norm = _normalize(q)
 
     # pass 1: exact (case-insensitive)
-    for t in data.keys():
-        if t.lower() == q.lower():
-            return t, 1.0
+    if q.lower() in index.by_lower:
+        return index.by_lower[q.lower()], 1.0
 
     # pass 2: normalized exact
-    title_by_norm = { _normalize(t): t for t in data.keys() }
-    if q_norm in title_by_norm:
-        return title_by_norm[q_norm], 0.98
-
-    # pass 3: fuzzy match
-    best_title = None
-    best_score = 0.0
-    for t in data.keys():
-        s = SequenceMatcher(None, q_norm, _normalize(t)).ratio()
-        if s > best_score:
-            best_score = s
-            best_title = t
-    if best_title and best_score >= 0.72:
-        return best_title, best_score
+    if q_norm in index.by_norm:
+        return index.by_norm[q_norm], 0.98
+
+    # pass 3: fuzzy match (plain ratio: partial/token scorers rate short
+    # titles sharing one word with the query far too high)
+    best_pos, best_score = None, 0.0
+    match = process.extractOne(q_norm, index.norm_titles, scorer=fuzz.ratio)
+    if match is not None:
+        _, score, best_pos = match
+        best_score = score / 100.0
+    if best_pos is not None and best_score >= 0.72:
+        return best_pos, best_score
 
     # pass 4: containment heuristic
-    for t in data.keys():
-        t_norm = _normalize(t)
-        if q_norm and (q_norm in t_norm or t_norm in q_norm):
-            # give a mid score
-            return t, max(best_score, 0.66)
+    if q_norm:
+        for i, t_norm in enumerate(index.norm_titles):
+            if q_norm in t_norm or t_norm in q_norm:
+                # give a mid score
+                return i, max(best_score, 0.66)
 
     return None, best_score
 
 
-def get_summary_by_title(title: str, data_path: str = str(DEFAULT_DATA_PATH)) -> Dict[str, str]:
+@lru_cache(maxsize=512)
+def _match_title(key: str, data_path: str) -> Tuple[Optional[int], float]:
+    # `key` is the stripped, lowercased query; every pass is case-insensitive.
+    return _best_title_match(key, _load_title_index(data_path))
+
+
+def get_summary_by_title(
+    title: str,
+    data_path: str = str(DEFAULT_DATA_PATH),
+    index: Optional[_TitleIndex] = None,
+) -> Dict[str, str]:
     """Return a dict with the matched title and its full summary.
+
+    When `index` is given the title is matched against it (and `data_path`
+    is ignored); otherwise the cached index for `data_path` is used.
     
     Returns:
         { "title": matched_title, "summary": "...", "match_score": 0.0-1.0 }
@@ -107,13 +220,17 @@ def get_summary_by_title(title: str, data_path: str = str(DEFAULT_DATA_PATH)) ->
         FileNotFoundError / ValueError if dataset invalid.
         KeyError if no reasonable match found.
     """
-    data = _load_full_summaries(data_path)
-    best_title, score = _best_title_match(title, data)
-    if not best_title:
+    key = (title or "").strip().lower()
+    if index is not None:
+        pos, score = _best_title_match(key, index)
+    else:
+        index = _load_title_index(data_path)
+        pos, score = _match_title(key, data_path)
+    if pos is None:
         raise KeyError(f"No matching title found for: {title!r}")
     return {
-        "title": best_title,
-        "summary": data[best_title],
+        "title": index.titles[pos],
+        "summary": index.summaries[pos],
         "match_score": round(float(score), 4),
     }
 
@@ -142,15 +259,20 @@ def build_tools_spec() -> list:
     ]
 
 
-def handle_tool_call(name: str, arguments_json: str, data_path: str = str(DEFAULT_DATA_PATH)) -> Dict[str, str]:
+def handle_tool_call(
+    name: str,
+    arguments_json: str,
+    data_path: str = str(DEFAULT_DATA_PATH),
+    index: Optional[_TitleIndex] = None,
+) -> Dict[str, str]:
     """Dispatch a tool call by name and return a JSON-serializable result."""
     if name == "get_summary_by_title":
         try:
-            args = json.loads(arguments_json or "{}")
-        except json.JSONDecodeError:
+            args = orjson.loads(arguments_json or "{}")
+        except orjson.JSONDecodeError:
             raise ValueError("Invalid JSON arguments for get_summary_by_title")
         title = args.get("title")
         if not title or not isinstance(title, str):
             raise ValueError("Argument 'title' must be a non-empty string.")
-        return get_summary_by_title(title=title, data_path=data_path)
+        return get_summary_by_title(title=title, data_path=data_path, index=index)
     raise ValueError(f"Unknown tool: {name}")
@@ -5,17 +5,21 @@ Ingest short book summaries into Chroma (persistent, local).
 - Parses data/book_summaries.md (Title, short summary, Themes)
 - Creates embeddings with OpenAI (text-embedding-3-small by default)
 - Upserts into a Chroma persistent collection
-- Stores useful metadata (title, themes, source)
+- Stores useful metadata (title, normalized title, themes, short summary, source)
+- Writes a NumPy snapshot of small collections for brute-force queries
+- Precomputes the tool's title index next to the full-summaries JSON
 
 Run:
     python -m app.rag.ingest \
         --data-file data/book_summaries.md \
         --persist-dir data/chroma \
-        --collection books_v1
+        --collection books_v1 \
+        --summaries-file data/book_summaries_full.json
 """
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 import re
 from pathlib import Path
@@ -24,12 +28,21 @@ from typing import Dict, List
 import chromadb
 
 from app.llm.openai_client import OpenAIClient
+from app.llm.tools import _normalize, build_title_index
+from app.rag.summaries import short_summary
+from app.rag.vectorstore import get_chroma_collection, write_numpy_snapshot
+
+_RE_SLUG_NONALNUM = re.compile(r"[^a-z0-9]+")
+_RE_SLUG_DASHES = re.compile(r"-{2,}")
+_RE_TITLE_HEADER = re.compile(r"(?m)^##\s*Title:\s*")
+_RE_THEMES_LINE = re.compile(r"(?mi)^Themes:\s*(.+)$")
+_RE_THEMES_SEP = re.compile(r"[,|]")
 
 
 def slugify(text: str) -> str:
     text = text.strip().lower()
-    text = re.sub(r"[^a-z0-9]+", "-", text)
-    text = re.sub(r"-{2,}", "-", text).strip("-")
+    text = _RE_SLUG_NONALNUM.sub("-", text)
+    text = _RE_SLUG_DASHES.sub("-", text).strip("-")
     return text or "untitled"
 
 
@@ -46,7 +59,7 @@ def parse_book_summaries_md(path: Path) -> List[Dict]:
     """
     text = path.read_text(encoding="utf-8")
     # Split by "## Title:" headers
-    parts = re.split(r"(?m)^##\s*Title:\s*", text)
+    parts = _RE_TITLE_HEADER.split(text)
     entries: List[Dict] = []
     for part in parts:
         part = part.strip()
@@ -60,11 +73,11 @@ def parse_book_summaries_md(path: Path) -> List[Dict]:
         title = title_line.strip()
 
         # Find Themes line
-        m = re.search(r"(?mi)^Themes:\s*(.+)$", rest)
+        m = _RE_THEMES_LINE.search(rest)
         themes: List[str] = []
         if m:
             themes_line = m.group(1)
-            themes = [t.strip() for t in re.split(r"[,|]", themes_line) if t.strip()]
+            themes = [t.strip() for t in _RE_THEMES_SEP.split(themes_line) if t.strip()]
             summary_text = rest[: m.start()].strip()
         else:
             summary_text = rest.strip()
@@ -122,7 +135,9 @@ def upsert_into_chroma(
     metadatas = [
     {
         "title": e["title"],
+        "norm_title": _normalize(e["title"]),
         "themes": ", ".join(e.get("themes", [])) if e.get("themes") else None,
+        "short_summary": short_summary(e["summary"]),
         "source": "book_summaries.md",
     }
     for e in entries
@@ -148,6 +163,7 @@ def main() -> None:
     parser.add_argument("--data-file", type=str, default="data/book_summaries.md")
     parser.add_argument("--persist-dir", type=str, default="data/chroma")
     parser.add_argument("--collection", type=str, default="books_v1")
+    parser.add_argument("--summaries-file", type=str, default="data/book_summaries_full.json")
     args = parser.parse_args()
 
     data_path = Path(args.data_file)
@@ -162,7 +178,7 @@ def main() -> None:
 
     # Create embeddings with OpenAI
     client = OpenAIClient()  # loads settings from .env
-    embeddings = client.embed_texts(docs)
+    embeddings = asyncio.run(client.aembed_texts(docs))
 
     persist_dir = Path(args.persist_dir)
     upsert_into_chroma(
@@ -173,10 +189,23 @@ def main() -> None:
         collection_name=args.collection,
     )
 
+    snapshot = write_numpy_snapshot(
+        get_chroma_collection(str(persist_dir), args.collection),
+        persist_dir=str(persist_dir),
+        collection_name=args.collection,
+    )
+    if snapshot:
+        print(f"Wrote NumPy snapshot: {snapshot}")
+
+    index_path = build_title_index(args.summaries_file)
+    print(f"Wrote title index: {index_path}")
+
     # Optional: write a manifest for traceability
     manifest = {
         "collection": args.collection,
         "count": len(entries),
+        "embedding_model": client.settings.embedding_model,
+        "embedding_dimensions": len(embeddings[0]),
         "data_file": str(data_path),
         "persist_dir": str(persist_dir),
     }
@@ -3,16 +3,79 @@ Retriever: embed the user query and fetch top-k documents from Chroma.
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List
-from app.llm.openai_client import OpenAIClient
+import asyncio
+import weakref
+from typing import Any, Dict, List, Optional
+from app.llm.openai_client import OpenAIClient, get_client
+from .summaries import short_summary
 from .vectorstore import get_collection
 
+# Indexes ingested before short summaries were stored as metadata only have
+# them inside the document text ("Title: ...\nSummary: ...\nThemes: ...").
+_INCLUDE = ["metadatas", "distances"]
+_INCLUDE_LEGACY = ["metadatas", "documents", "distances"]
+
+# Collection handles known to be legacy, keyed by id() (Chroma collections are
+# unhashable); the weakref drops the entry once the handle is collected.
+_LEGACY_COLLECTIONS: Dict[int, "weakref.ref[Any]"] = {}
+
+
+def _include_for(col: Any) -> List[str]:
+    ref = _LEGACY_COLLECTIONS.get(id(col))
+    return _INCLUDE_LEGACY if ref is not None and ref() is col else _INCLUDE
+
+
+def _mark_legacy(col: Any) -> None:
+    key = id(col)
+    _LEGACY_COLLECTIONS[key] = weakref.ref(col, lambda _: _LEGACY_COLLECTIONS.pop(key, None))
+
+
+def _lacks_short_summaries(res: Dict[str, Any]) -> bool:
+    metas = (res.get("metadatas") or [[]])[0]
+    return any("short_summary" not in (md or {}) for md in metas)
+
+
+def _short_summary_from_document(doc: Optional[str]) -> str:
+    if not doc:
+        return ""
+    parts = doc.split("Summary:", 1)
+    if len(parts) < 2:
+        return doc.strip()
+    return short_summary(parts[1].split("Themes:", 1)[0])
+
+
+def _to_results(res: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten a single-query Chroma result into a list of dicts."""
+    out: List[Dict[str, Any]] = []
+    ids = (res.get("ids") or [[]])[0]
+    metas = (res.get("metadatas") or [[]])[0]
+    dists = (res.get("distances") or [[]])[0]
+    docs = (res.get("documents") or [[None] * len(ids)])[0]
+
+    for i in range(len(ids)):
+        md = metas[i] or {}
+        summary = md.get("short_summary")
+        if summary is None:
+            summary = _short_summary_from_document(docs[i])
+        out.append({
+            "id": ids[i],
+            "title": md.get("title"),
+            "norm_title": md.get("norm_title"),
+            "themes": md.get("themes"),
+            "short_summary": summary,
+            "source": md.get("source"),
+            "distance": dists[i],
+        })
+    return out
+
 
 def retrieve(
     query: str,
     top_k: int = 5,
     persist_dir: str = "data/chroma",
     collection_name: str = "books_v1",
+    client: Optional[OpenAIClient] = None,
+    collection: Any = None,
 ) -> List[Dict[str, Any]]:
     """
     Retrieve top-k documents for a given natural-language query.
@@ -20,40 +83,63 @@ def retrieve(
     Returns a list of dicts:
         {
             "id": str,
-            "document": str,
             "title": str,
+            "norm_title": str | None,   # title as normalized by the summaries tool
             "themes": str | None,   # comma-separated
+            "short_summary": str | None,
             "source": str,
             "distance": float,      # lower is better (cosine distance)
         }
+
+    `client` / `collection` reuse already-open handles; by default they come
+    from `get_client()` and `get_collection(persist_dir, collection_name)`.
     """
-    client = OpenAIClient()
+    client = client or get_client()
     [q_emb] = client.embed_texts([query])
 
-    col = get_collection(persist_dir=persist_dir, collection_name=collection_name)
-    res = col.query(
-        query_embeddings=[q_emb],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"]
-    )
+    col = collection
+    if col is None:
+        col = get_collection(persist_dir=persist_dir, collection_name=collection_name)
+    include = _include_for(col)
+    res = col.query(query_embeddings=[q_emb], n_results=top_k, include=include)
+    if include is _INCLUDE and _lacks_short_summaries(res):
+        _mark_legacy(col)
+        res = col.query(query_embeddings=[q_emb], n_results=top_k, include=_INCLUDE_LEGACY)
+    return _to_results(res)
 
-    out: List[Dict[str, Any]] = []
-    ids = (res.get("ids") or [[]])[0]
-    docs = (res.get("documents") or [[]])[0]
-    metas = (res.get("metadatas") or [[]])[0]
-    dists = (res.get("distances") or [[]])[0]
 
-    for i in range(len(ids)):
-        md = metas[i] or {}
-        out.append({
-            "id": ids[i],
-            "document": docs[i],
-            "title": md.get("title"),
-            "themes": md.get("themes"),
-            "source": md.get("source"),
-            "distance": dists[i],
-        })
-    return out
+async def aretrieve(
+    query: str,
+    top_k: int = 5,
+    persist_dir: str = "data/chroma",
+    collection_name: str = "books_v1",
+    client: Optional[OpenAIClient] = None,
+    collection: Any = None,
+) -> List[Dict[str, Any]]:
+    """
+    Async variant of `retrieve`; same arguments and return shape.
+
+    The query embedding goes through AsyncOpenAI. Opening the collection
+    (SQLite/HNSW load on a cold start) and the query itself are blocking, so
+    they run in worker threads; the open overlaps the embedding request.
+    """
+    client = client or get_client()
+    if collection is None:
+        [q_emb], col = await asyncio.gather(
+            client.aembed_texts([query]),
+            asyncio.to_thread(get_collection, persist_dir=persist_dir, collection_name=collection_name),
+        )
+    else:
+        [q_emb] = await client.aembed_texts([query])
+        col = collection
+    include = _include_for(col)
+    res = await asyncio.to_thread(col.query, query_embeddings=[q_emb], n_results=top_k, include=include)
+    if include is _INCLUDE and _lacks_short_summaries(res):
+        _mark_legacy(col)
+        res = await asyncio.to_thread(
+            col.query, query_embeddings=[q_emb], n_results=top_k, include=_INCLUDE_LEGACY
+        )
+    return _to_results(res)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+"""
+Summary text helpers shared by ingest and the retriever.
+"""
+from __future__ import annotations
+
+
+def short_summary(summary: str, limit: int = 800) -> str:
+    """Summary as shown to the LLM in the retrieval context (capped at `limit` chars)."""
+    summary = summary.strip()
+    if len(summary) > limit:
+        summary = summary[:limit].rstrip() + "…"
+    return summary
@@ -1,16 +1,158 @@
 """
 Vector store helpers for Chroma (persistent local index).
+
+Small collections (fewer than NUMPY_MAX_ROWS rows) are also written by ingest
+as a NumPy snapshot next to the Chroma files. When a snapshot exists,
+`get_collection` serves queries from it with one matrix-vector product
+instead of going through Chroma's HNSW index.
 """
 from __future__ import annotations
 
+import json
+import os
+import time
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
 import chromadb
+import numpy as np
 
+NUMPY_MAX_ROWS = 1024
 
-def get_collection(persist_dir: str = "data/chroma", collection_name: str = "books_v1"):
+
+def _snapshot_paths(persist_dir: str, collection_name: str) -> Tuple[Path, Path]:
+    # `<name>_emb.npy` is the pre-versioning embeddings file; snapshots now
+    # name theirs in `_rows.json` (see write_numpy_snapshot).
+    p = Path(persist_dir)
+    return p / f"{collection_name}_emb.npy", p / f"{collection_name}_rows.json"
+
+
+class NumpyCollection:
     """
-    Return a Chroma collection, creating it if needed.
+    Brute-force cosine search over an in-memory (mmap'd) embedding matrix.
+
+    Implements the subset of Chroma's Collection API used by the retriever:
+    `count()` and `query(query_embeddings, n_results, include)`, with the same
+    result shape and cosine distances.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: List[str],
+        metadatas: List[Optional[Dict[str, Any]]],
+        documents: Optional[List[Optional[str]]] = None,
+    ) -> None:
+        # rows are expected to be L2-normalized float32 (see write_numpy_snapshot)
+        self.embeddings = embeddings
+        self.ids = ids
+        self.metadatas = metadatas
+        # only snapshots written before documents were dropped carry them
+        self.documents = documents if documents is not None else [None] * len(ids)
+
+    @classmethod
+    def load(cls, persist_dir: str, collection_name: str) -> Optional["NumpyCollection"]:
+        """Open the snapshot for a collection, or return None if there is none."""
+        legacy_emb_path, rows_path = _snapshot_paths(persist_dir, collection_name)
+        if not rows_path.exists():
+            return None
+        rows = json.loads(rows_path.read_text(encoding="utf-8"))
+        emb_path = rows_path.with_name(rows["embeddings"]) if "embeddings" in rows else legacy_emb_path
+        if not emb_path.exists():
+            return None
+        embeddings = np.load(emb_path, mmap_mode="r")
+        if embeddings.shape[0] != len(rows["ids"]):
+            return None
+        return cls(embeddings, rows["ids"], rows["metadatas"], rows.get("documents"))
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        include: Sequence[str] = ("metadatas", "documents", "distances"),
+    ) -> Dict[str, Any]:
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(norms == 0, 1.0, norms)
+        scores = q @ self.embeddings.T  # (n_queries, n_rows) cosine similarity
+
+        k = min(n_results, self.count())
+        res: Dict[str, Any] = {"ids": [], "documents": None, "metadatas": None, "distances": None}
+        for name in ("documents", "metadatas", "distances"):
+            if name in include:
+                res[name] = []
+        for row in scores:
+            if k < len(row):
+                top = np.argpartition(-row, k - 1)[:k]
+            else:
+                top = np.arange(len(row))
+            top = top[np.argsort(-row[top], kind="stable")]
+            res["ids"].append([self.ids[i] for i in top])
+            if res["documents"] is not None:
+                res["documents"].append([self.documents[i] for i in top])
+            if res["metadatas"] is not None:
+                res["metadatas"].append([self.metadatas[i] for i in top])
+            if res["distances"] is not None:
+                res["distances"].append([float(1.0 - row[i]) for i in top])
+        return res
+
+
+def _embedding_files(persist_dir: str, collection_name: str) -> List[Path]:
+    p = Path(persist_dir)
+    return [*p.glob(f"{collection_name}_emb.npy"), *p.glob(f"{collection_name}_emb.*.npy")]
+
+
+def _remove_embedding_files(persist_dir: str, collection_name: str, keep: Optional[Path] = None) -> None:
+    for f in _embedding_files(persist_dir, collection_name):
+        if f != keep:
+            try:
+                f.unlink(missing_ok=True)
+            except OSError:
+                pass  # still mapped by a running process (Windows); removed next time
+
+
+def write_numpy_snapshot(collection: Any, persist_dir: str, collection_name: str) -> Optional[Path]:
+    """
+    Mirror a Chroma collection into a NumPy snapshot if it is small enough.
+
+    Every snapshot writes its embeddings to a new file and then atomically
+    replaces `_rows.json`, which names that file. Processes that still have
+    the previous snapshot mapped keep reading the old (now unlinked) file,
+    and loaders never pair new rows with old vectors.
+
+    Large collections get any stale snapshot removed so queries go to Chroma.
+
+    Returns:
+        Path of the embeddings file, or None if no snapshot was written.
     """
+    _, rows_path = _snapshot_paths(persist_dir, collection_name)
+    if collection.count() >= NUMPY_MAX_ROWS:
+        rows_path.unlink(missing_ok=True)
+        _remove_embedding_files(persist_dir, collection_name)
+        return None
+
+    got = collection.get(include=["embeddings", "metadatas"])
+    emb = np.asarray(got["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    emb = emb / np.where(norms == 0, 1.0, norms)
+
+    emb_path = rows_path.with_name(f"{collection_name}_emb.{time.time_ns():x}.npy")
+    with open(emb_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(emb))
+    rows = {"embeddings": emb_path.name, "ids": got["ids"], "metadatas": got["metadatas"]}
+    tmp = rows_path.with_name(rows_path.name + ".tmp")
+    tmp.write_text(json.dumps(rows), encoding="utf-8")
+    os.replace(tmp, rows_path)
+    _remove_embedding_files(persist_dir, collection_name, keep=emb_path)
+    return emb_path
+
+
+def open_chroma_collection(persist_dir: str = "data/chroma", collection_name: str = "books_v1"):
+    """Open a Chroma collection, creating it if needed (uncached)."""
     p = Path(persist_dir)
     p.mkdir(parents=True, exist_ok=True)
     client = chromadb.PersistentClient(path=str(p))
@@ -24,3 +166,46 @@ def get_collection(persist_dir: str = "data/chroma", collection_name: str = "boo
         # Fallback for versions not supporting metadata kw
         collection = client.get_or_create_collection(name=collection_name)
     return collection
+
+
+@lru_cache(maxsize=8)
+def get_chroma_collection(persist_dir: str = "data/chroma", collection_name: str = "books_v1"):
+    """
+    Return a Chroma collection, creating it if needed.
+
+    Handles are cached per (persist_dir, collection_name) so the index is
+    opened once per process.
+    """
+    return open_chroma_collection(persist_dir, collection_name)
+
+
+def open_collection(persist_dir: str = "data/chroma", collection_name: str = "books_v1"):
+    """Uncached `get_collection`: reads the snapshot / opens Chroma afresh."""
+    snapshot = NumpyCollection.load(persist_dir, collection_name)
+    if snapshot is not None:
+        return snapshot
+    return open_chroma_collection(persist_dir, collection_name)
+
+
+@lru_cache(maxsize=8)
+def _load_snapshot(persist_dir: str, collection_name: str, version: Tuple[int, int]) -> Optional[NumpyCollection]:
+    # `version` (mtime, inode of _rows.json) keys the cache: a new snapshot
+    # is picked up on the next call, older ones stay valid for their holders.
+    return NumpyCollection.load(persist_dir, collection_name)
+
+
+def get_collection(persist_dir: str = "data/chroma", collection_name: str = "books_v1"):
+    """
+    Return the queryable collection: the NumPy snapshot when ingest wrote one
+    (small collections), otherwise the Chroma collection.
+    """
+    _, rows_path = _snapshot_paths(persist_dir, collection_name)
+    try:
+        st = rows_path.stat()
+    except FileNotFoundError:
+        st = None
+    if st is not None:
+        snapshot = _load_snapshot(persist_dir, collection_name, (st.st_mtime_ns, st.st_ino))
+        if snapshot is not None:
+            return snapshot
+    return get_chroma_collection(persist_dir, collection_name)
@@ -0,0 +1,34 @@
+
+from app.llm.cache import LLMCache, MemoryBackend
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def test_chat_roundtrip_counts_hits_and_misses():
+    cache = LLMCache(MemoryBackend())
+    key, cached = cache.get_chat("gpt-4o-mini", MESSAGES, None, 0.2)
+    assert key and cached is None
+    cache.set_chat(key, {"message": {"content": "Hello"}})
+    _, cached = cache.get_chat("gpt-4o-mini", MESSAGES, None, 0.2)
+    assert cached == {"message": {"content": "Hello"}}
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_chat_key_depends_on_inputs():
+    k1 = LLMCache.chat_key("gpt-4o-mini", MESSAGES, None, 0.2)
+    assert k1 == LLMCache.chat_key("gpt-4o-mini", [dict(MESSAGES[0])], None, 0.2)
+    assert k1 != LLMCache.chat_key("gpt-4o", MESSAGES, None, 0.2)
+    assert k1 != LLMCache.chat_key("gpt-4o-mini", MESSAGES, None, 0.0)
+
+
+def test_high_temperature_is_not_cached():
+    cache = LLMCache(MemoryBackend(), max_temperature=0.3)
+    key, cached = cache.get_chat("gpt-4o-mini", MESSAGES, None, 0.9)
+    assert key is None and cached is None
+
+
+def test_embeddings_are_cached_per_text():
+    cache = LLMCache(MemoryBackend())
+    cache.set_embeddings("m", ["a"], [[1.0, 0.0]])
+    assert cache.get_embeddings("m", ["a", "b"]) == [[1.0, 0.0], None]
+    assert cache.get_embeddings("other", ["a"]) == [None]
@@ -0,0 +1,28 @@
+import orjson
+from app.llm.chain import _direct_tool_message
+from app.llm.tools import _load_title_index, _normalize
+
+DATA_PATH = "data/book_summaries_full.json"
+
+
+def _hit(title, distance=0.1, with_norm=True):
+    return {"title": title, "norm_title": _normalize(title) if with_norm else None, "distance": distance}
+
+
+def test_fast_path_calls_tool_for_known_close_title():
+    index = _load_title_index(DATA_PATH)
+    for hit in (_hit("Dune"), _hit("DUNE!", with_norm=False)):
+        msg = _direct_tool_message([hit], index)
+        assert msg is not None
+        [call] = msg["tool_calls"]
+        assert call["function"]["name"] == "get_summary_by_title"
+        assert orjson.loads(call["function"]["arguments"]) == {"title": hit["title"]}
+
+
+def test_fast_path_rejects_partial_matches_and_far_hits():
+    index = _load_title_index(DATA_PATH)
+    for title in ("Dune Messiah", "The Road Less Traveled", "Brave New World Revisited"):
+        assert _direct_tool_message([_hit(title)], index) is None
+        assert _direct_tool_message([_hit(title, with_norm=False)], index) is None
+    assert _direct_tool_message([_hit("Dune", distance=0.4)], index) is None
+    assert _direct_tool_message([], index) is None
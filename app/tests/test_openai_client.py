@@ -0,0 +1,35 @@
+import asyncio
+
+from app.llm.openai_client import OpenAIClient, OpenAISettings, _pack_batches, run_async
+
+
+def test_pack_batches_respects_token_budget():
+    assert _pack_batches([4, 4, 4, 4], max_inputs=10, max_tokens=8) == [[0, 1], [2, 3]]
+
+
+def test_pack_batches_respects_input_cap():
+    assert _pack_batches([1] * 5, max_inputs=2, max_tokens=100) == [[0, 1], [2, 3], [4]]
+
+
+def test_oversized_item_gets_its_own_batch():
+    assert _pack_batches([2, 50, 2], max_inputs=10, max_tokens=10) == [[0], [1], [2]]
+
+
+def test_run_async_reuses_one_event_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = run_async(current_loop())
+    assert run_async(current_loop()) is first
+    assert not first.is_closed()
+
+
+def test_small_embedding_requests_skip_token_counting(monkeypatch):
+    def fail(*args):
+        raise AssertionError("tokenizer should not be needed")
+
+    monkeypatch.setattr("app.llm.openai_client._count_tokens", fail)
+    client = OpenAIClient(OpenAISettings(api_key="sk-test"))
+    texts = ["a query", "another short text"]
+    assert client._embedding_batches("text-embedding-3-small", texts, [0, 1]) == [[0, 1]]
+    assert client._embedding_batches("text-embedding-3-small", ["x" * 10**6], [0]) == [[0]]
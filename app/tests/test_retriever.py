@@ -0,0 +1,51 @@
+import numpy as np
+from app.rag.retriever import retrieve
+from app.rag.vectorstore import NumpyCollection
+
+
+class _FakeClient:
+    def embed_texts(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+
+def test_legacy_index_falls_back_to_document_summaries():
+    # built before short summaries were stored as metadata: documents only
+    col = NumpyCollection(
+        np.eye(2, dtype=np.float32),
+        ["a", "b"],
+        [{"title": "A"}, {"title": "B"}],
+        ["Title: A\nSummary: Alpha story.\nThemes: x, y", "Title: B\nSummary: Beta."],
+    )
+    [hit, _] = retrieve("q", top_k=2, client=_FakeClient(), collection=col)
+    assert hit["title"] == "A"
+    assert hit["short_summary"] == "Alpha story."
+
+
+def test_legacy_index_is_queried_with_documents_after_first_miss():
+    includes = []
+
+    class _CountingCollection(NumpyCollection):
+        def query(self, query_embeddings, n_results=10, include=()):
+            includes.append(list(include))
+            return super().query(query_embeddings, n_results=n_results, include=include)
+
+    col = _CountingCollection(
+        np.eye(2, dtype=np.float32),
+        ["a", "b"],
+        [{"title": "A"}, {"title": "B"}],
+        ["Title: A\nSummary: Alpha story.", "Title: B\nSummary: Beta."],
+    )
+    retrieve("q", top_k=1, client=_FakeClient(), collection=col)
+    [hit] = retrieve("q", top_k=1, client=_FakeClient(), collection=col)
+    assert hit["short_summary"] == "Alpha story."
+    assert len(includes) == 3 and "documents" in includes[-1]
+
+
+def test_short_summary_metadata_is_used_directly():
+    col = NumpyCollection(
+        np.eye(2, dtype=np.float32),
+        ["a", "b"],
+        [{"title": "A", "short_summary": "From metadata."}, {"title": "B", "short_summary": "B."}],
+    )
+    [hit] = retrieve("q", top_k=1, client=_FakeClient(), collection=col)
+    assert hit["short_summary"] == "From metadata."
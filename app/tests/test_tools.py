@@ -1,7 +1,9 @@
 
 import json
+import os
+import shutil
 import pytest
-from app.llm.tools import get_summary_by_title
+from app.llm.tools import _normalize, _read_title_index, build_title_index, get_summary_by_title, handle_tool_call
 
 DATA_PATH = "data/book_summaries_full.json"
 
@@ -19,6 +21,54 @@ def test_fuzzy_title_case_insensitive():
     assert out["match_score"] >= 0.72
 
 
+def test_unknown_title_sharing_words_prefers_closest_title():
+    # not in the dataset; shares words with several titles ("the", "harry potter")
+    out = get_summary_by_title("Harry Potter and the Chamber of Secrets", data_path=DATA_PATH)
+    assert out["title"] == "Harry Potter and the Sorcerer's Stone"
+    assert out["match_score"] < 0.8
+    # a bare stopword only gets the low containment score
+    assert get_summary_by_title("the", data_path=DATA_PATH)["match_score"] == 0.66
+
+
 def test_no_match_raises():
     with pytest.raises(KeyError):
         get_summary_by_title("This Title Does Not Exist", data_path=DATA_PATH)
+
+
+def test_lookup_ignores_case_and_surrounding_whitespace():
+    a = get_summary_by_title("  dUNE ", data_path=DATA_PATH)
+    b = get_summary_by_title("Dune", data_path=DATA_PATH)
+    assert a == b
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert _normalize("  Cien Años de Soledad! ") == "cien anos de soledad"
+    assert _normalize("Crème brûlée,\tÉtude") == "creme brulee etude"
+
+
+def test_prebuilt_index_gives_same_results(tmp_path):
+    json_path = tmp_path / "summaries.json"
+    shutil.copy(DATA_PATH, json_path)
+    sidecar = build_title_index(str(json_path))
+    assert sidecar.exists()
+    out = get_summary_by_title("harry potter sorcerers stone", data_path=str(json_path))
+    assert out == get_summary_by_title("harry potter sorcerers stone", data_path=DATA_PATH)
+
+
+def test_tool_call_uses_the_given_index(tmp_path):
+    json_path = tmp_path / "summaries.json"
+    json_path.write_text(json.dumps({"Dune": "A desert planet."}), encoding="utf-8")
+    index = _read_title_index(str(json_path))
+    out = handle_tool_call("get_summary_by_title", json.dumps({"title": "dune"}), index=index)
+    assert out["summary"] == "A desert planet."
+
+
+def test_prebuilt_index_ignored_after_source_changes(tmp_path):
+    json_path = tmp_path / "summaries.json"
+    json_path.write_text(json.dumps({"Dune": "A desert planet."}), encoding="utf-8")
+    sidecar = build_title_index(str(json_path))
+    # rewrite the JSON but make it look older than the sidecar
+    json_path.write_text(json.dumps({"Emma": "A matchmaker."}), encoding="utf-8")
+    old = sidecar.stat().st_mtime_ns - 10**9
+    os.utime(json_path, ns=(old, old))
+    assert _read_title_index(str(json_path)).titles == ("Emma",)
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+from app.rag.vectorstore import NumpyCollection, get_collection, write_numpy_snapshot
+
+
+class _FakeChroma:
+    def __init__(self, embeddings, ids):
+        self._embeddings = embeddings
+        self._ids = ids
+
+    def count(self):
+        return len(self._ids)
+
+    def get(self, include):
+        return {
+            "ids": self._ids,
+            "embeddings": np.asarray(self._embeddings, dtype=np.float64),
+            "documents": [f"doc {i}" for i in self._ids],
+            "metadatas": [{"title": i} for i in self._ids],
+        }
+
+
+def test_snapshot_query_ranks_by_cosine_distance(tmp_path):
+    fake = _FakeChroma([[1, 0, 0], [0, 2, 0], [1, 1, 0]], ["a", "b", "c"])
+    assert write_numpy_snapshot(fake, str(tmp_path), "books") is not None
+
+    col = NumpyCollection.load(str(tmp_path), "books")
+    assert col.count() == 3
+    res = col.query(query_embeddings=[[0, 1, 0]], n_results=2, include=["metadatas", "distances"])
+    assert res["ids"] == [["b", "c"]]
+    assert res["metadatas"] == [[{"title": "b"}, {"title": "c"}]]
+    assert res["documents"] is None
+    np.testing.assert_allclose(res["distances"][0], [0.0, 1 - 1 / np.sqrt(2)], atol=1e-6)
+
+
+def test_no_snapshot_for_large_collections(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.rag.vectorstore.NUMPY_MAX_ROWS", 2)
+    fake = _FakeChroma([[1, 0], [0, 1]], ["a", "b"])
+    assert write_numpy_snapshot(fake, str(tmp_path), "books") is None
+    assert NumpyCollection.load(str(tmp_path), "books") is None
+
+
+def test_resnapshot_leaves_open_handles_valid(tmp_path):
+    rng = np.random.default_rng(0)
+    big = _FakeChroma(rng.normal(size=(200, 8)), [f"a{i}" for i in range(200)])
+    write_numpy_snapshot(big, str(tmp_path), "books")
+    old = get_collection(str(tmp_path), "books")
+    assert old.count() == 200
+
+    small = _FakeChroma(rng.normal(size=(20, 8)), [f"b{i}" for i in range(20)])
+    write_numpy_snapshot(small, str(tmp_path), "books")
+
+    # the old mapping still reads its own vectors, paired with its own rows
+    res = old.query(query_embeddings=[old.embeddings[5]], n_results=1, include=["distances"])
+    assert res["ids"] == [["a5"]]
+    new = get_collection(str(tmp_path), "books")
+    assert new.count() == 20 and new.ids[0] == "b0"
+    assert len(list(tmp_path.glob("books_emb*.npy"))) == 1
+    assert "documents" not in json.loads((tmp_path / "books_rows.json").read_text())
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
-import os, sys
+import asyncio, html, itertools, queue, re, sys
+from functools import lru_cache
 from pathlib import Path
 import streamlit as st
 
-# Ensure project root for imports
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
-from app.llm.chain import run_chain
+# Ensure project root for imports (once; the script re-executes on every rerun)
+_ROOT = str(Path(__file__).resolve().parents[2])
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+from app.llm.chain import arun_chain_stream, build_chain_context
+from app.llm.openai_client import shared_event_loop
 
 st.set_page_config(page_title="Smart Librarian", page_icon="📚", layout="wide")
 
@@ -77,26 +81,164 @@ html, body, [class*="css"]{
 .neo-badge{display:inline-block; padding:2px 8px; font-size:12px; border:1px solid var(--border); border-radius: 8px; color: var(--muted);}
 .neo-pill{display:inline-block; padding:6px 10px; font-size:12px; border:1px solid var(--border); border-radius:999px; margin:4px 6px 0 0; color:var(--text); background: rgba(124,92,255,0.08);}
 .neo-small{color: var(--muted); font-size: 13px;}
+.neo-grid{display:grid; grid-template-columns:1fr 1fr; gap:10px;}
 </style>
 """
-st.markdown(NEO_CSS, unsafe_allow_html=True)
+
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+# The stylesheet is re-sent on every full rerun (Streamlit drops elements a
+# run does not emit), so ship it minified; done once at import.
+NEO_CSS_MIN = _minify_css(NEO_CSS)
+st.markdown(NEO_CSS_MIN, unsafe_allow_html=True)
+
+# ---------- Chain context ----------
+@st.cache_resource(show_spinner=False)
+def _get_chain_ctx(persist_dir, collection_name, model):
+    # Client, collection and title index are opened once per configuration
+    return build_chain_context(persist_dir=persist_dir, collection_name=collection_name, model=model)
+
+
+async def _astream_to_queue(q, **kwargs):
+    """Forward arun_chain_stream events to `q`; None marks the end."""
+    try:
+        async for item in arun_chain_stream(**kwargs):
+            q.put(item)
+    except Exception as e:
+        q.put(("error", e))
+    finally:
+        q.put(None)
+
+
+SPINNER_FRAMES = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
+
+@lru_cache(maxsize=16)
+def _read_manifest(path, mtime_ns):
+    # `mtime_ns` is part of the cache key: a re-ingest invalidates the entry
+    return Path(path).read_text(encoding="utf-8")
+
+
+@lru_cache(maxsize=256)
+def _summary_filename(title):
+    # spaces and characters that are not allowed in file names -> "_"
+    return re.sub(r'[\s\\/:*?"<>|]+', "_", title) + ".txt"
+
+
+# ---------- Rendering helpers ----------
+# Static markup is built once; each render only substitutes the dynamic parts.
+REC_CARD_TMPL = (
+    '<div class="neo-card neo-accent">'
+    '<div class="neo-title" style="font-size:18px;">✅ {title}</div>'
+    '<div class="neo-small" style="margin-top:6px;">Model chose one title based on retrieved context.</div>'
+    '<div style="margin-top:12px;">{body}</div>'
+    '</div>'
+)
+RETRIEVAL_CARD_TMPL = (
+    '<div class="neo-card">'
+    '<div class="neo-title" style="font-size:16px;">{title}</div>'
+    '<div class="neo-small">Distance: {distance}</div>'
+    '<div style="margin-top:8px;">{pills}</div>'
+    '</div>'
+)
+PILL_TMPL = "<span class='neo-pill'>{}</span>"
+HERO_HTML = (
+    '<div class="neo-hero">'
+    '<h1>Find the one book that fits.</h1>'
+    '<p>Describe the vibe, themes, or plot. I’ll retrieve, choose exactly one title, and include its full summary.</p>'
+    '</div>'
+)
+
+
+def _rec_card_html(title_html, content):
+    # `title_html` is already escaped (see the "meta" event handling)
+    return REC_CARD_TMPL.format(
+        title=title_html or "No title chosen",
+        body=content or "No content available.",
+    )
+
+
+@lru_cache(maxsize=1024)
+def _themes_pills(themes):
+    """Pill markup for a comma-separated themes string (escaped)."""
+    return "".join(PILL_TMPL.format(html.escape(t.strip())) for t in themes.split(",") if t.strip())
+
+
+def _escape_retrieval(retrieval):
+    """Attach HTML-escaped title and theme pills to each hit, once per answer."""
+    for r in retrieval:
+        r["_title_html"] = html.escape(r.get("title") or "")
+        r["_pills_html"] = _themes_pills(r.get("themes") or "")
+    return retrieval
+
+
+def _render_retrieval(retrieval):
+    # expects hits prepared by `_escape_retrieval`
+    st.markdown("###### Retrieval context")
+    cards = []
+    for r in retrieval:
+        dist = r.get("distance")
+        cards.append(RETRIEVAL_CARD_TMPL.format(
+            title=r["_title_html"],
+            distance=f"{dist:.4f}" if isinstance(dist, (int, float)) else "",
+            pills=r["_pills_html"],
+        ))
+    # one element for all cards, laid out two per row by CSS grid
+    st.markdown(f'<div class="neo-grid">{"".join(cards)}</div>', unsafe_allow_html=True)
+
+
+def _render_summary(chosen_title, full_summary, key=None):
+    st.markdown("###### Full summary")
+    st.markdown(f"""<div class="neo-card">{full_summary}</div>""", unsafe_allow_html=True)
+    st.download_button(
+        "Download summary",
+        data=full_summary,
+        file_name=_summary_filename(chosen_title or "summary"),
+        mime="text/plain",
+        use_container_width=True,
+        key=key,
+    )
+
+
+def render_out(out):
+    """Recommendation, full summary and retrieval cards of a finished answer."""
+    st.markdown("###### Recommendation")
+    st.markdown(_rec_card_html(out["_title_html"], out.get("content")), unsafe_allow_html=True)
+    if out.get("full_summary"):
+        _render_summary(out.get("chosen_title"), out["full_summary"], key="last_out_download")
+    if out.get("retrieval"):
+        _render_retrieval(out["retrieval"])
+
 
 # ---------- Sidebar ----------
+# Widgets are keyed so the chat fragment can read them from session state.
+# They sit in a form: edits and slider drags apply (and rerun) only on submit.
 with st.sidebar:
     st.markdown("#### Settings")
-    persist_dir = st.text_input("Persist dir", "data/chroma")
-    collection_name = st.text_input("Collection", "books_v1")
-    top_k = st.slider("Top-K", 1, 10, 5, 1)
-    model_override = st.text_input("Chat model (override)", "")
+    with st.form("settings", border=False):
+        persist_dir = st.text_input("Persist dir", "data/chroma", key="persist_dir")
+        collection_name = st.text_input("Collection", "books_v1", key="collection_name")
+        st.slider("Top-K", 1, 10, 5, 1, key="top_k")
+        st.text_input("Chat model (override)", "", key="model_override")
+        st.form_submit_button("Apply", use_container_width=True)
     if st.button("Clear chat"):
         st.session_state.pop("messages", None)
+        st.session_state.pop("last_out", None)
+        # the next query rebuilds its context: collection reopened, titles reloaded
+        _get_chain_ctx.clear()
         st.rerun()
 
     manifest_path = Path(persist_dir) / f"{collection_name}_manifest.json"
     if manifest_path.exists():
         st.success("Index ready ✅")
         with st.expander("Manifest"):
-            st.code(manifest_path.read_text(encoding="utf-8"), language="json")
+            st.code(_read_manifest(str(manifest_path), manifest_path.stat().st_mtime_ns), language="json")
 
 # ---------- Top Nav ----------
 nav_l, nav_r = st.columns([0.75, 0.25])
@@ -106,105 +248,143 @@ with nav_r:
     st.markdown("<div style='height:42px;'></div>", unsafe_allow_html=True)
 
 # ---------- Hero ----------
-st.markdown("""
-<div class="neo-hero">
-  <h1>Find the one book that fits.</h1>
-  <p>Describe the vibe, themes, or plot. I’ll retrieve, choose exactly one title, and include its full summary.</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(HERO_HTML, unsafe_allow_html=True)
 
 # ---------- Prompt chips ----------
-cols = st.columns(3)
-examples = [
+EXAMPLES = (
     "friendship and magic at a boarding school",
     "post-apocalyptic father and son survival, bleak but hopeful",
     "classic romance with sharp social commentary and character growth",
-]
-labels = ["✨ Friendship & Magic", "🌫️ Post-apocalyptic journey", "💌 Classic romance & wit"]
-chip_clicked = None
-for i in range(3):
-    with cols[i]:
-        if st.button(labels[i], use_container_width=True):
-            chip_clicked = examples[i]
-
-st.divider()
-
-# ---------- Chat history ----------
-if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "assistant", "content": "Hi! Tell me what kind of book you are looking for."}]
-
-for m in st.session_state.messages:
-    with st.chat_message(m["role"]):
-        st.markdown(m["content"])
-
-# ---------- Input ----------
-user_prompt = st.chat_input("Ask for a book by theme, vibe, or plot elements...")
-if chip_clicked and not user_prompt:
-    user_prompt = chip_clicked
-
-if user_prompt:
+)
+LABELS = ("✨ Friendship & Magic", "🌫️ Post-apocalyptic journey", "💌 Classic romance & wit")
+
+
+def _queue_prompt(prompt):
+    st.session_state["_pending_prompt"] = prompt
+
+
+def chips_row():
+    """Example prompts; rendered inside the chat fragment, so a click reruns only that."""
+    cols = st.columns(len(EXAMPLES))
+    for i, (col, label, example) in enumerate(zip(cols, LABELS, EXAMPLES)):
+        with col:
+            # the callback runs before the rerun the click triggers, so the chat
+            # panel picks the prompt up in that same run
+            st.button(
+                label,
+                key=f"chip{i}",
+                use_container_width=True,
+                on_click=_queue_prompt,
+                args=(example,),
+            )
+    st.divider()
+
+
+# ---------- Chat ----------
+# Only the most recent messages are re-rendered on each run; older ones sit
+# behind a toggle.
+HISTORY_WINDOW = 20
+
+
+@st.fragment
+def chat_panel():
+    """Chips, history, input and answer; a prompt or chip click reruns only this panel."""
+    chips_row()
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = [{"role": "assistant", "content": "Hi! Tell me what kind of book you are looking for."}]
+
+    history = st.session_state.messages
+    hidden = len(history) - HISTORY_WINDOW
+    if hidden > 0 and not st.toggle(f"Show {hidden} earlier messages", key="show_full_history"):
+        history = history[hidden:]
+    last_out = st.session_state.get("last_out")
+    for i, m in enumerate(history, start=len(st.session_state.messages) - len(history)):
+        with st.chat_message(m["role"]):
+            # the latest answer keeps its cards across reruns (widget changes)
+            if last_out is not None and i == len(st.session_state.messages) - 1 and m["role"] == "assistant":
+                render_out(last_out)
+            else:
+                st.markdown(m["content"])
+
+    chip_prompt = st.session_state.pop("_pending_prompt", None)
+    user_prompt = st.chat_input("Ask for a book by theme, vibe, or plot elements...") or chip_prompt
+
+    if not user_prompt:
+        return
+
     st.session_state.messages.append({"role": "user", "content": user_prompt})
     with st.chat_message("user"):
         st.markdown(user_prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking…"):
-            try:
-                out = run_chain(
-                    query=user_prompt,
-                    top_k=top_k,
-                    persist_dir=persist_dir,
-                    collection_name=collection_name,
-                    model=(model_override or None),
-                )
-                content = (out.get("content") or "").strip()
-                chosen_title = out.get("chosen_title")
-                full_summary = out.get("full_summary")
-                retrieval = out.get("retrieval") or []
-
-                st.markdown("###### Recommendation")
-                st.markdown(f"""
-                    <div class="neo-card neo-accent">
-                      <div class="neo-title" style="font-size:18px;">✅ {chosen_title or 'No title chosen'}</div>
-                      <div class="neo-small" style="margin-top:6px;">Model chose one title based on retrieved context.</div>
-                      <div style="margin-top:12px;">{content if content else 'No content available.'}</div>
-                    </div>
-                """, unsafe_allow_html=True)
-
-                if full_summary:
-                    st.markdown("###### Full summary")
-                    st.markdown(f"""<div class="neo-card">{full_summary}</div>""", unsafe_allow_html=True)
-                    st.download_button(
-                        "Download summary",
-                        data=full_summary.encode("utf-8"),
-                        file_name=f"{(chosen_title or 'summary').replace(' ', '_')}.txt",
-                        mime="text/plain",
-                        use_container_width=True,
-                    )
-
-                if retrieval:
-                    st.markdown("###### Retrieval context")
-                    cols2 = st.columns(2)
-                    for i, r in enumerate(retrieval):
-                        with cols2[i % 2]:
-                            title = r.get("title") or ""
-                            dist = r.get("distance")
-                            dist_str = f"{dist:.4f}" if isinstance(dist, (int, float)) else ""
-                            themes = (r.get("themes") or "").split(",")
-                            pills = "".join([f"<span class='neo-pill'>{t.strip()}</span>" for t in themes if t.strip()])
-                            st.markdown(f"""
-                                <div class="neo-card" style="margin-bottom:10px;">
-                                  <div class="neo-title" style="font-size:16px;">{title}</div>
-                                  <div class="neo-small">Distance: {dist_str}</div>
-                                  <div style="margin-top:8px;">{pills}</div>
-                                </div>
-                            """, unsafe_allow_html=True)
-
-                history_block = content
-                if chosen_title and (not content or chosen_title not in content):
-                    history_block = f"**Recommendation:** {chosen_title}\n\n" + (content or "")
-                st.session_state.messages.append({"role": "assistant", "content": history_block})
-
-            except Exception as e:
-                st.error(f"Error: {e}")
-                st.info("Tips: run ingest, set OPENAI_API_KEY in .env, and start Streamlit from project root.")
+        # Slots in display order; each is filled as its part of the chain finishes.
+        st.markdown("###### Recommendation")
+        rec_slot = st.empty()
+        summary_slot = st.empty()
+        retrieval_slot = st.empty()
+        rec_slot.markdown(_rec_card_html("", "Thinking…"), unsafe_allow_html=True)
+        try:
+            chosen_title = None
+            title_html = ""
+            out = {}
+            buf = []
+            ctx = _get_chain_ctx(
+                st.session_state["persist_dir"],
+                st.session_state["collection_name"],
+                st.session_state["model_override"] or None,
+            )
+            events = queue.Queue()
+            # The chain runs on the shared event loop (which also keeps the async
+            # OpenAI client's connections alive); this thread only renders.
+            asyncio.run_coroutine_threadsafe(
+                _astream_to_queue(events, query=user_prompt, top_k=st.session_state["top_k"], ctx=ctx),
+                shared_event_loop(),
+            )
+            frames = itertools.cycle(SPINNER_FRAMES)
+            while True:
+                try:
+                    item = events.get(timeout=0.1)
+                except queue.Empty:
+                    if not buf:
+                        rec_slot.markdown(_rec_card_html(title_html, f"Thinking… {next(frames)}"), unsafe_allow_html=True)
+                    continue
+                if item is None:
+                    break
+                event, payload = item
+                if event == "error":
+                    raise payload
+                if event == "retrieval":
+                    if payload:
+                        with retrieval_slot.container():
+                            _render_retrieval(_escape_retrieval(payload))
+                elif event == "meta":
+                    chosen_title = payload.get("chosen_title")
+                    title_html = html.escape(chosen_title or "")
+                    full_summary = payload.get("full_summary")
+                    if full_summary:
+                        with summary_slot.container():
+                            _render_summary(chosen_title, full_summary)
+                elif event == "token":
+                    buf.append(payload)
+                    rec_slot.markdown(_rec_card_html(title_html, "".join(buf)), unsafe_allow_html=True)
+                elif event == "done":
+                    out = payload
+
+            content = (out.get("content") or "").strip()
+            rec_slot.markdown(_rec_card_html(title_html, content), unsafe_allow_html=True)
+
+            history_block = content
+            if chosen_title and (not content or chosen_title not in content):
+                history_block = f"**Recommendation:** {chosen_title}\n\n" + (content or "")
+            st.session_state.messages.append({"role": "assistant", "content": history_block})
+            out["_title_html"] = title_html
+            out["retrieval"] = _escape_retrieval(out.get("retrieval") or [])
+            st.session_state["last_out"] = out
+
+        except Exception as e:
+            st.error(f"Error: {e}")
+            st.info("Tips: run ingest, set OPENAI_API_KEY in .env, and start Streamlit from project root.")
+
+
+chat_panel()